@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microml import compiler, profiler
+
+
+def program(depth, branches):
+    lines = ["f0 x = x + 1"]
+    for i in range(1, depth + 1):
+        lines.append("f{} x = f{}(x) + f{}(x + 1)".format(i, i - 1, i - 1))
+    lines.append("pick n a b = if n < 1 then a else b")
+    lines.append("twice x = x + x")
+    calls = "0"
+    for i in range(branches):
+        calls = "pick({}, twice(f{}({})), {}) + ({})".format(i % 2, depth, i, i, calls)
+    lines.append("main = lambda -> print({})".format(calls))
+    return lines
+
+
+def run(lines, lazy):
+    c = compiler.Compiler(interactive=False)
+    for line in lines:
+        c.compile(line)
+    p = profiler.Profiler()
+    start = time.perf_counter()
+    c.interpret(p, lazy=lazy)
+    return p.steps, time.perf_counter() - start
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    branches = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    lines = program(depth, branches)
+    results = {}
+    for name, lazy in [("strict", False), ("lazy", True)]:
+        results[name] = run(lines, lazy)
+    for name, (steps, elapsed) in results.items():
+        print("{:>8}: {:>10} calls {:>10.3f} ms".format(name, steps, elapsed * 1000))
+    saved = 1 - results["lazy"][0] / results["strict"][0]
+    print("call-by-need saved {:.1%} of the calls".format(saved))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microml import compiler, lexer, parser
+
+OPERATORS = ["+", "-", "*", "/"]
+
+
+# Declarations are kept well below the parser's nesting limit, so that the
+# whole program also typechecks and compiles.
+def source(terms, width):
+    lines = ["f0 x = x"]
+    for k in range(1, terms // width + 1):
+        parts = ["x"]
+        for i in range(1, width):
+            parts.append(OPERATORS[i % len(OPERATORS)])
+            if i % 7 == 0:
+                parts.append("f{}(x + {})".format(k - 1, i))
+            elif i % 5 == 0:
+                parts.append("(if x < {} then x else {})".format(i, i + 1))
+            else:
+                parts.append(str(i))
+        lines.append("f{} x = {}".format(k, " ".join(parts)))
+    return lines
+
+
+def count_tokens(lines):
+    lex = lexer.Lexer()
+    count = 0
+    for line in lines:
+        lex.start(line)
+        count += sum(1 for _ in lex.tokens())
+    return count
+
+
+def best(repeat, run):
+    fastest = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest
+
+
+def parse(lines):
+    p = parser.Parser()
+    for line in lines:
+        p.parse(line)
+
+
+def compile(lines):
+    c = compiler.Compiler(interactive=False)
+    for line in lines:
+        c.compile(line)
+
+
+def main():
+    terms = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    width = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    lines = source(terms, width)
+    tokens = count_tokens(lines)
+    for name, run in [("parse", parse), ("compile", compile)]:
+        elapsed = best(repeat, lambda: run(lines))
+        print(
+            "{:>8}: {} tokens in {:.3f} ms: {:,.0f} tokens/sec".format(
+                name, tokens, elapsed * 1000, tokens / elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
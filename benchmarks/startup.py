@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, "examples", "simple_add.ml")
+
+
+def measure(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    baseline = measure([sys.executable, "-c", "pass"], runs)
+    check = measure([sys.executable, "-m", "microml", EXAMPLE, "--check"], runs)
+    overhead = (check - baseline) * 1000
+    print(
+        "python: {:.1f} ms, typecheck: {:.1f} ms, overhead: {:.1f} ms (budget {:.0f} ms)".format(
+            baseline * 1000, check * 1000, overhead, budget
+        )
+    )
+    if overhead > budget:
+        print("startup regression: overhead exceeds the budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
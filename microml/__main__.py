@@ -0,0 +1,108 @@
+import sys
+
+from microml import compiler, exceptions
+
+
+def repl():
+    import readline
+
+    from microml import profiler
+
+    c = compiler.Compiler(tier_threshold=1000, background=True)
+
+    while True:
+        try:
+            line = input("> ")
+        except (EOFError, KeyboardInterrupt):
+            print("\nMoriturus te saluto!")
+            return
+
+        if not line:
+            continue
+
+        if line in [":q", "quit"]:
+            print("Moriturus te saluto!")
+            return
+
+        if line in [":i", "interpret"]:
+            try:
+                c.interpret()
+            except exceptions.MLException as e:
+                print("{}: {}".format(e.module, e))
+            continue
+
+        words = line.split()
+        if words[:1] == [":p"] and len(words) <= 2 or line == "profile":
+            p = profiler.Profiler()
+            try:
+                c.interpret(p)
+            except exceptions.MLException as e:
+                print("{}: {}".format(e.module, e))
+            print(p.report())
+            if len(words) > 1:
+                p.write_collapsed(words[1])
+            continue
+
+        if line in [":l", "lazy"]:
+            try:
+                c.interpret(lazy=True)
+            except exceptions.MLException as e:
+                print("{}: {}".format(e.module, e))
+            continue
+
+        if words[:1] == [":ir"] and len(words) <= 2 or line == "ir":
+            print(c.dump(words[1] if len(words) > 1 else None))
+            continue
+
+        if line in [":e", "execute"]:
+            try:
+                c.execute()
+            except exceptions.MLException as e:
+                print("{}: {}".format(e.module, e))
+            continue
+
+        try:
+            c.compile(line)
+        except exceptions.MLException as e:
+            if e.location:
+                print("{}^".format(" " * (e.location + 1)))
+            print("{}: {}".format(e.module, e))
+
+
+USAGE = "usage: python -m microml [<file> [--check | --kernel <function> <output>]]"
+
+
+def main():
+    if len(sys.argv) == 1:
+        return repl()
+    options = sys.argv[2:]
+    check = options == ["--check"]
+    kernel = len(options) == 3 and options[0] == "--kernel"
+    if options and not check and not kernel:
+        sys.exit(USAGE)
+    c = compiler.Compiler(interactive=False)
+    with open(sys.argv[1]) as f:
+        contents = f.read()
+    while contents:
+        stop = c.compile(contents)
+        if not stop:
+            break
+        contents = contents[stop:]
+    if check:
+        for node in c.code:
+            print("{} :: {}".format(node.name, c.symtab[node.name]))
+        return
+    if kernel:
+        return c.kernel(options[1], options[2])
+    c.execute()
+
+
+def run():
+    try:
+        main()
+    except exceptions.MLException as e:
+        print("{}: {}".format(e.module, e))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,313 @@
+import itertools
+
+from microml import ast, exceptions, typing
+
+# Interpreter hooks live in the environment under keys that no identifier
+# can collide with, so they travel along with it into every call.
+TRACER = "<tracer>"
+LAZY = "<lazy>"
+
+
+class Var:
+    def __init__(self, name, typ, glob=False):
+        self.name = name
+        self.typ = typ
+        self.glob = glob
+
+    def __str__(self):
+        return self.name
+
+    def key(self):
+        return self
+
+    def eval(self, local, glob):
+        if self.glob:
+            return glob[self.name]
+        return local[self.name]
+
+
+class Const:
+    def __init__(self, value, typ):
+        self.value = value
+        self.typ = typ
+
+    def __str__(self):
+        if isinstance(self.typ, typing.Bool):
+            return "true" if self.value else "false"
+        return str(self.value)
+
+    def key(self):
+        return ("const", str(self))
+
+    def eval(self, local, glob):
+        return self.value
+
+
+class Prim:
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def __str__(self):
+        return "{} {} {}".format(self.left, self.op, self.right)
+
+    def eval(self, local, glob):
+        return ast.OPERATORS[self.op](
+            force(self.left.eval(local, glob)), force(self.right.eval(local, glob))
+        )
+
+
+class Call:
+    def __init__(self, f, args, origin):
+        self.f = f
+        self.args = args
+        self.origin = origin
+
+    def __str__(self):
+        return "{}({})".format(self.f, ", ".join(str(a) for a in self.args))
+
+    def eval(self, local, glob):
+        f = force(self.f.eval(local, glob))
+        args = [arg.eval(local, glob) for arg in self.args]
+        tracer = glob.get(TRACER)
+        if tracer is not None:
+            return tracer.apply(self.origin, f, glob, args)
+        return f.eval(glob, args)
+
+
+class Cond:
+    def __init__(self, ifx, thenx, elsex):
+        self.ifx = ifx
+        self.thenx = thenx
+        self.elsex = elsex
+
+    def eval(self, local, glob):
+        if force(self.ifx.eval(local, glob)):
+            return run(self.thenx, local, glob)
+        return run(self.elsex, local, glob)
+
+
+class Fn:
+    def __init__(self, params, block):
+        self.params = params
+        self.block = block
+
+    def eval(self, local, glob):
+        return Closure(self, local, glob)
+
+
+class Block:
+    def __init__(self, bindings, result):
+        self.bindings = bindings
+        self.result = result
+
+    def eval(self, local, glob):
+        return run(self, local, glob)
+
+
+class Function:
+    def __init__(self, name, fn, typ):
+        self.name = name
+        self.fn = fn
+        self.typ = typ
+
+
+class Value:
+    def __init__(self, name, block, typ):
+        self.name = name
+        self.block = block
+        self.typ = typ
+
+
+class Closure:
+    def __init__(self, fn, local, glob, name=None):
+        self.fn = fn
+        self.local = local
+        self.glob = glob
+        self.name = name
+
+    def eval(self, env, args):
+        params = self.fn.params
+        if len(args) != len(params):
+            raise exceptions.MLEvalException(
+                "lambda was called with {} arguments, but expected {}".format(
+                    len(args), len(params)
+                )
+            )
+        local = dict(self.local)
+        for i in range(len(args)):
+            local[params[i].name] = args[i]
+        return run(self.fn.block, local, self.glob)
+
+
+class Thunk:
+    def __init__(self, expr, local, glob):
+        self.expr = expr
+        self.local = local
+        self.glob = glob
+        self.value = None
+
+    def force(self):
+        if self.expr is not None:
+            self.value = self.expr.eval(self.local, self.glob)
+            self.expr = self.local = self.glob = None
+        return self.value
+
+
+def force(value):
+    if isinstance(value, Thunk):
+        return value.force()
+    return value
+
+
+# Under call-by-need, every binding but a lambda is suspended until it is
+# first used, and arguments are passed on unevaluated. A block is only run
+# when its value is needed, so its result is forced.
+def run(block, local, glob):
+    if glob.get(LAZY):
+        for var, expr in block.bindings:
+            if isinstance(expr, Fn):
+                local[var.name] = expr.eval(local, glob)
+            else:
+                local[var.name] = Thunk(expr, local, glob)
+        return force(block.result.eval(local, glob))
+    for var, expr in block.bindings:
+        local[var.name] = expr.eval(local, glob)
+    return block.result.eval(local, glob)
+
+
+def environment(decls, env):
+    for decl in decls:
+        if isinstance(decl, Function):
+            env[decl.name] = Closure(decl.fn, {}, env, decl.name)
+        elif env.get(LAZY):
+            env[decl.name] = Thunk(decl.block, {}, env)
+        else:
+            env[decl.name] = run(decl.block, {}, env)
+    return env
+
+
+class Lowering:
+    def __init__(self, pure):
+        self.pure = pure
+        self.counter = itertools.count()
+
+    # Locals all get names in the ml_ namespace, which is reserved for
+    # generated code, so they can neither shadow nor be shadowed by a global.
+    def fresh(self, typ, name=None):
+        n = next(self.counter)
+        if name is None:
+            return Var("ml_{}".format(n), typ)
+        return Var("ml_{}_{}".format(n, name), typ)
+
+    def block(self, node, scope, available):
+        bindings = []
+        result = self.atom(node, scope, bindings, available)
+        return Block(bindings, result)
+
+    def bind(self, expr, typ, bindings, available, key=None):
+        if key is not None and key in available:
+            return available[key]
+        var = self.fresh(typ)
+        bindings.append((var, expr))
+        if key is not None:
+            available[key] = var
+        return var
+
+    def atom(self, node, scope, bindings, available):
+        if isinstance(node, ast.Val):
+            return Const(node.eval({}), node.typ)
+        if isinstance(node, ast.Id):
+            if node.name in scope:
+                return scope[node.name]
+            return Var(node.name, node.typ, glob=True)
+        if isinstance(node, ast.Op):
+            left = self.atom(node.left, scope, bindings, available)
+            right = self.atom(node.right, scope, bindings, available)
+            key = ("op", node.op, cse_key(left), cse_key(right))
+            return self.bind(
+                Prim(node.op, left, right), node.typ, bindings, available, key
+            )
+        if isinstance(node, ast.App):
+            f = self.atom(node.f, scope, bindings, available)
+            args = [self.atom(arg, scope, bindings, available) for arg in node.args]
+            key = None
+            if f.glob and f.name in self.pure:
+                key = ("call", f.name, *(cse_key(arg) for arg in args))
+            return self.bind(Call(f, args, node), node.typ, bindings, available, key)
+        if isinstance(node, ast.If):
+            ifx = self.atom(node.ifx, scope, bindings, available)
+            thenx = self.block(node.thenx, scope, dict(available))
+            elsex = self.block(node.elsex, scope, dict(available))
+            return self.bind(Cond(ifx, thenx, elsex), node.typ, bindings, available)
+        if isinstance(node, ast.Lambda):
+            fn = self.function(node, scope)
+            return self.bind(fn, node.typ, bindings, available)
+        raise exceptions.MLCompilerException("unknown node {}".format(type(node)))
+
+    def function(self, node, scope):
+        params = [self.fresh(node.argtypes[name], name) for name in node.argnames]
+        scope = {**scope, **dict(zip(node.argnames, params))}
+        return Fn(params, self.block(node.expr, scope, {}))
+
+
+def cse_key(atom):
+    if isinstance(atom, Var) and atom.glob:
+        return ("global", atom.name)
+    return atom.key()
+
+
+def lower(decl, pure):
+    lowering = Lowering(pure)
+    if isinstance(decl.expr, ast.Lambda):
+        return Function(decl.name, lowering.function(decl.expr, {}), decl.expr.typ)
+    return Value(decl.name, lowering.block(decl.expr, {}, {}), decl.expr.typ)
+
+
+def calls(block):
+    for _, expr in block.bindings:
+        if isinstance(expr, Call):
+            yield expr
+        elif isinstance(expr, Cond):
+            yield from calls(expr.thenx)
+            yield from calls(expr.elsex)
+        elif isinstance(expr, Fn):
+            yield from calls(expr.block)
+
+
+def is_pure(decl, pure):
+    block = decl.fn.block if isinstance(decl, Function) else decl.block
+    return all(call.f.glob and call.f.name in pure for call in calls(block))
+
+
+def dump_block(block, typeof, indent):
+    lines = []
+    pad = "  " * indent
+    for var, expr in block.bindings:
+        head = "{}{}: {} = ".format(pad, var, typeof(var.typ))
+        if isinstance(expr, Cond):
+            lines.append("{}if {} then".format(head, expr.ifx))
+            lines.extend(dump_block(expr.thenx, typeof, indent + 1))
+            lines.append("{}else".format(pad))
+            lines.extend(dump_block(expr.elsex, typeof, indent + 1))
+        elif isinstance(expr, Fn):
+            lines.append(
+                "{}lambda {} ->".format(head, ", ".join(map(str, expr.params)))
+            )
+            lines.extend(dump_block(expr.block, typeof, indent + 1))
+        else:
+            lines.append("{}{}".format(head, expr))
+    lines.append("{}{}".format(pad, block.result))
+    return lines
+
+
+def dump(decl, typeof):
+    if isinstance(decl, Function):
+        params = " ".join("({}: {})".format(p, typeof(p.typ)) for p in decl.fn.params)
+        head = "{} {} =".format(decl.name, params) if params else decl.name + " ="
+        body = decl.fn.block
+    else:
+        head = "{} =".format(decl.name)
+        body = decl.block
+    return "\n".join([head, *dump_block(body, typeof, 1)])
@@ -19,9 +19,6 @@ class Val(Node):
     def __str__(self):
         return str(self.value)
 
-    def compile(self, unifier):
-        return str(int(self.value))
-
 
 class Int(Val):
     def eval(self, env):
@@ -40,9 +37,6 @@ class Id(Node):
     def __str__(self):
         return self.name
 
-    def compile(self, unifier):
-        return self.name
-
     def eval(self, env):
         return env[self.name]
 
@@ -57,6 +51,7 @@ OPERATORS = {
     ">": operator.gt,
     ">=": operator.ge,
     "==": operator.eq,
+    "!=": operator.ne,
 }
 
 
@@ -70,11 +65,6 @@ class Op(Node):
     def __str__(self):
         return "({} {} {})".format(self.left, self.op, self.right)
 
-    def compile(self, unifier):
-        return "{} {} {}".format(
-            self.left.compile(unifier), self.op, self.right.compile(unifier)
-        )
-
     def find_op(self):
         return OPERATORS[self.op]
 
@@ -91,9 +81,6 @@ class App(Node):
     def __str__(self):
         return "{}({})".format(self.f, ", ".join(str(a) for a in self.args))
 
-    def compile(self, unifier):
-        return "{}({})".format(self.f, ", ".join(a.compile(unifier) for a in self.args))
-
     def eval(self, env):
         f = self.f.eval(env)
         return f.eval(env, [arg.eval(env) for arg in self.args])
@@ -109,13 +96,6 @@ class If(Node):
     def __str__(self):
         return "(if {} then {} else {})".format(self.ifx, self.thenx, self.elsex)
 
-    def compile(self, unifier):
-        return "{} ? {} : {}".format(
-            self.ifx.compile(unifier),
-            self.thenx.compile(unifier),
-            self.elsex.compile(unifier),
-        )
-
     def eval(self, env):
         if self.ifx.eval(env):
             return self.thenx.eval(env)
@@ -133,18 +113,6 @@ class Lambda(Node):
 
     argtypes = None
 
-    def compile(self, unifier):
-        typ = unifier(self.expr.typ).to_c()
-        compiled = self.expr.compile(unifier)
-        body = "return {};".format(compiled)
-        return "({}) {{\n{}\n}}".format(
-            ", ".join(
-                "{} {}".format(unifier(self.argtypes[name]).to_c(), name)
-                for name in self.argnames
-            ),
-            "\n".join("  {}".format(l) for l in body.split("\n")),
-        )
-
     def eval(self, env, args):
         new_env = dict(env)
         if len(args) != len(self.argnames):
@@ -167,11 +135,15 @@ class Decl(Node):
     def __str__(self):
         return "{} = {}".format(self.name, self.expr)
 
-    def compile(self, unifier):
-        typ = unifier(self.expr.typ).to_c()
-        if isinstance(self.expr, Lambda):
-            return "{} {}{}".format(typ, self.name, self.expr.compile(unifier))
-        return "{} {} = {};".format(typ, self.name, self.expr.compile(unifier))
-
     def eval(self, env):
         env[self.name] = self.expr
+
+
+def free_names(node, bound=frozenset()):
+    if isinstance(node, Id):
+        return set() if node.name in bound else {node.name}
+    if isinstance(node, Lambda):
+        bound = bound | set(node.argnames)
+    names = set()
+    node.visit_children(lambda c: names.update(free_names(c, bound)))
+    return names
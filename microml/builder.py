@@ -0,0 +1,83 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+
+from microml import exceptions
+
+
+class Build:
+    def __init__(self, build, generation, emit):
+        self.build = build
+        self.generation = generation
+        self.emit = emit
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "main")
+        self.proc = None
+        self.error = None
+        self.errors = ""
+        self.cancelled = False
+        self.done = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            with self.lock:
+                if self.cancelled:
+                    return
+            with tempfile.TemporaryFile() as errors:
+                try:
+                    self.build(
+                        self.emit,
+                        self.output,
+                        stderr=errors,
+                        started=self.started,
+                    )
+                except exceptions.MLException as e:
+                    self.error = e
+                errors.seek(0)
+                self.errors = errors.read().decode("utf-8", "replace")
+        finally:
+            with self.lock:
+                self.done = True
+                if self.cancelled:
+                    shutil.rmtree(self.directory, ignore_errors=True)
+
+    def started(self, proc):
+        with self.lock:
+            self.proc = proc
+            if self.cancelled:
+                proc.kill()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.proc is not None and self.proc.poll() is None:
+                self.proc.kill()
+            if self.done:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wait(self):
+        self.thread.join()
+
+
+class Builder:
+    def __init__(self, build):
+        self.build = build
+        self.current = None
+        atexit.register(self.cancel)
+
+    def submit(self, generation, emit):
+        if self.current is not None and self.current.generation == generation:
+            return self.current
+        self.cancel()
+        self.current = Build(self.build, generation, emit)
+        return self.current
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
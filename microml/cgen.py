@@ -0,0 +1,270 @@
+from microml import anf, closure, typing
+
+# with checked arithmetic, these are computed in long long and any result
+# outside of int sets ml_overflow instead of being undefined behaviour
+CHECKED = {"+", "-", "*"}
+
+
+def c_name(name):
+    # the ml_ prefix is reserved for generated code, so user names using it
+    # are moved out of the way
+    if name.startswith("ml_"):
+        return "ml_u" + name
+    return name
+
+
+class NotConstant(Exception):
+    pass
+
+
+class Emitter:
+    def __init__(self, typeof, functions, checked=False):
+        self.typeof = typeof
+        self.functions = functions
+        self.checked = checked
+        self.conversion = None
+
+    def c_type(self, typ):
+        typ = self.typeof(typ)
+        if isinstance(typ, typing.Func):
+            return "ml_closure*"
+        if isinstance(typ, typing.TypeVar):
+            return "int"
+        return typ.to_c()
+
+    def field(self, typ):
+        return "f" if isinstance(self.typeof(typ), typing.Func) else "i"
+
+    def signature(self, name, params, typ, static=False, self_arg=False):
+        args = ["ml_closure* ml_self"] if self_arg else []
+        args.extend("{} {}".format(self.c_type(p.typ), p) for p in params)
+        return "{}{} {}({})".format(
+            "static " if static else "",
+            self.c_type(self.typeof(typ).rettype),
+            name,
+            ", ".join(args) or "void",
+        )
+
+    def lifted_signature(self, lifted):
+        return self.signature(
+            lifted.name,
+            lifted.fn.params,
+            lifted.typ,
+            static=True,
+            self_arg=bool(lifted.captures),
+        )
+
+    def box_signature(self, name, typ):
+        argtypes = self.argtypes(typ)
+        params = [anf.Var("ml_a{}".format(i), t) for i, t in enumerate(argtypes)]
+        return self.signature(
+            "ml_boxed_{}".format(name), params, typ, static=True, self_arg=True
+        )
+
+    def boxes(self):
+        for name, typ in self.conversion.boxed.items():
+            yield c_name(name), typ
+        # without an environment, a single static closure is enough
+        for lifted in self.conversion.lifted.values():
+            for fn in lifted:
+                if not fn.captures:
+                    yield fn.name, fn.typ
+
+    def argtypes(self, typ):
+        return self.typeof(typ).argtypes
+
+    def program(self, decls):
+        self.conversion = closure.convert(decls, self.functions)
+
+        header = []
+        for decl in decls:
+            for lifted in self.conversion.lifted[decl.name]:
+                header.append("{};".format(self.lifted_signature(lifted)))
+            if isinstance(decl, anf.Function):
+                header.append(
+                    "{};".format(
+                        self.signature(c_name(decl.name), decl.fn.params, decl.typ)
+                    )
+                )
+        for name, typ in self.boxes():
+            header.append("{};".format(self.box_signature(name, typ)))
+            header.append(
+                "static ml_closure ml_closure_{0} = {{(void (*)(void)) ml_boxed_{0}}};".format(
+                    name
+                )
+            )
+        yield "\n".join(header)
+
+        inits = []
+        for decl in decls:
+            for lifted in self.conversion.lifted[decl.name]:
+                yield self.lifted(lifted)
+            if isinstance(decl, anf.Function):
+                yield self.function(decl)
+                continue
+            try:
+                yield "{} {} = {};".format(
+                    self.c_type(decl.typ),
+                    c_name(decl.name),
+                    self.expression(decl.block, {}),
+                )
+            except NotConstant:
+                yield "{} {};".format(self.c_type(decl.typ), c_name(decl.name))
+                inits.append(decl)
+
+        for name, typ in self.boxes():
+            yield self.box(name, typ)
+
+        if inits:
+            yield self.initializer(inits)
+
+    def function(self, decl):
+        return "{} {{\n{}\n}}".format(
+            self.signature(c_name(decl.name), decl.fn.params, decl.typ),
+            "\n".join(self.block(decl.fn.block, "return ", 1)),
+        )
+
+    def lifted(self, lifted):
+        lines = [
+            "  {} {} = ml_self->env[{}].{};".format(
+                self.c_type(var.typ), var, i, self.field(var.typ)
+            )
+            for i, var in enumerate(lifted.captures)
+        ]
+        lines.extend(self.block(lifted.fn.block, "return ", 1))
+        return "{} {{\n{}\n}}".format(self.lifted_signature(lifted), "\n".join(lines))
+
+    def box(self, name, typ):
+        args = ", ".join("ml_a{}".format(i) for i in range(len(self.argtypes(typ))))
+        return "{} {{\n  return {}({});\n}}".format(
+            self.box_signature(name, typ), name, args
+        )
+
+    def initializer(self, decls):
+        lines = []
+        for decl in decls:
+            lines.append("  {")
+            lines.extend(self.block(decl.block, "{} = ".format(c_name(decl.name)), 2))
+            lines.append("  }")
+        return (
+            "__attribute__((constructor)) static void ml_init(void) {{\n{}\n}}".format(
+                "\n".join(lines)
+            )
+        )
+
+    def block(self, block, target, indent):
+        lines = []
+        pad = "  " * indent
+        for var, expr in block.bindings:
+            if isinstance(expr, anf.Cond):
+                lines.append("{}{} {};".format(pad, self.c_type(var.typ), var))
+                lines.append("{}if ({}) {{".format(pad, self.atom(expr.ifx)))
+                lines.extend(self.block(expr.thenx, "{} = ".format(var), indent + 1))
+                lines.append("{}}} else {{".format(pad))
+                lines.extend(self.block(expr.elsex, "{} = ".format(var), indent + 1))
+                lines.append("{}}}".format(pad))
+            elif isinstance(expr, anf.Fn):
+                lines.extend(self.make_closure(var, pad))
+            else:
+                lines.append(
+                    "{}{} {} = {};".format(
+                        pad, self.c_type(var.typ), var, self.expr(expr)
+                    )
+                )
+        lines.append("{}{}{};".format(pad, target, self.atom(block.result)))
+        return lines
+
+    def make_closure(self, var, pad):
+        lifted = self.conversion.known[var]
+        if not lifted.captures:
+            return ["{}ml_closure* {} = &ml_closure_{};".format(pad, var, lifted.name)]
+        lines = [
+            "{}ml_closure* {} = ml_alloc((void (*)(void)) {}, {});".format(
+                pad, var, lifted.name, len(lifted.captures)
+            )
+        ]
+        for i, captured in enumerate(lifted.captures):
+            lines.append(
+                "{}{}->env[{}].{} = {};".format(
+                    pad, var, i, self.field(captured.typ), captured
+                )
+            )
+        return lines
+
+    def atom(self, atom):
+        if isinstance(atom, anf.Const):
+            return str(int(atom.value))
+        if atom.glob and atom.name in self.functions:
+            return "&ml_closure_{}".format(c_name(atom.name))
+        return self.name(atom)
+
+    def name(self, var):
+        return c_name(var.name) if var.glob else var.name
+
+    def expr(self, expr):
+        if isinstance(expr, anf.Prim):
+            if self.checked and expr.op in CHECKED:
+                return "ml_check((long long) {} {} {})".format(
+                    self.atom(expr.left), expr.op, self.atom(expr.right)
+                )
+            return "{} {} {}".format(
+                self.atom(expr.left), expr.op, self.atom(expr.right)
+            )
+        return self.call(expr)
+
+    def call(self, expr):
+        f = expr.f
+        args = [self.atom(a) for a in expr.args]
+        if f.glob and f.name in self.functions:
+            return "{}({})".format(c_name(f.name), ", ".join(args))
+        lifted = self.conversion.known.get(f)
+        if lifted is not None:
+            if lifted.captures:
+                args.insert(0, f.name)
+            return "{}({})".format(lifted.name, ", ".join(args))
+        typ = self.typeof(f.typ)
+        return "(({} (*)({})) {}->fn)({})".format(
+            self.c_type(typ.rettype),
+            ", ".join(["ml_closure*", *(self.c_type(t) for t in typ.argtypes)]),
+            self.name(f),
+            ", ".join([self.name(f), *args]),
+        )
+
+    def expression(self, block, values):
+        values = dict(values)
+
+        def atom(a):
+            if isinstance(a, anf.Var) and not a.glob:
+                return values[a.name]
+            if isinstance(a, anf.Var) and a.name not in self.functions:
+                raise NotConstant()
+            return self.atom(a)
+
+        for var, expr in block.bindings:
+            if isinstance(expr, anf.Prim):
+                values[var.name] = "({} {} {})".format(
+                    atom(expr.left), expr.op, atom(expr.right)
+                )
+            elif isinstance(expr, anf.Cond):
+                values[var.name] = "({} ? {} : {})".format(
+                    atom(expr.ifx),
+                    self.expression(expr.thenx, values),
+                    self.expression(expr.elsex, values),
+                )
+            else:
+                raise NotConstant()
+        return atom(block.result)
+
+
+def functions(ir, print_type):
+    found = {"print": print_type}
+    for name, decl in ir.items():
+        if isinstance(decl, anf.Function):
+            found[name] = decl.typ
+    return found
+
+
+def emit(out, decls, typeof, functions, checked=False):
+    for part in Emitter(typeof, functions, checked).program(decls):
+        out.write(part)
+        out.write("\n")
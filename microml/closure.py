@@ -0,0 +1,80 @@
+from microml import anf
+
+
+class Lifted:
+    def __init__(self, name, fn, captures, typ):
+        self.name = name
+        self.fn = fn
+        self.captures = captures
+        self.typ = typ
+
+
+def free_vars(block, bound, found=None):
+    if found is None:
+        found = {}
+
+    def use(atom):
+        if isinstance(atom, anf.Var) and not atom.glob and atom.name not in bound:
+            found.setdefault(atom.name, atom)
+
+    bound = set(bound)
+    for var, expr in block.bindings:
+        if isinstance(expr, anf.Prim):
+            use(expr.left)
+            use(expr.right)
+        elif isinstance(expr, anf.Call):
+            use(expr.f)
+            for arg in expr.args:
+                use(arg)
+        elif isinstance(expr, anf.Cond):
+            use(expr.ifx)
+            free_vars(expr.thenx, bound, found)
+            free_vars(expr.elsex, bound, found)
+        elif isinstance(expr, anf.Fn):
+            free_vars(expr.block, bound | {p.name for p in expr.params}, found)
+        bound.add(var.name)
+    use(block.result)
+    return list(found.values())
+
+
+class Conversion:
+    def __init__(self, functions):
+        self.functions = functions
+        self.lifted = {}
+        self.known = {}
+        self.boxed = {}
+
+    def decl(self, decl):
+        self.lifted[decl.name] = []
+        if isinstance(decl, anf.Function):
+            self.block(decl.fn.block, decl.name)
+        else:
+            self.block(decl.block, decl.name)
+
+    def block(self, block, prefix):
+        for var, expr in block.bindings:
+            if isinstance(expr, anf.Call):
+                for arg in expr.args:
+                    self.use(arg)
+            elif isinstance(expr, anf.Cond):
+                self.block(expr.thenx, prefix)
+                self.block(expr.elsex, prefix)
+            elif isinstance(expr, anf.Fn):
+                self.block(expr.block, prefix)
+                captures = free_vars(expr.block, {p.name for p in expr.params})
+                name = "ml_lambda{}_{}".format(len(self.known), prefix)
+                lifted = Lifted(name, expr, captures, var.typ)
+                self.lifted[prefix].append(lifted)
+                self.known[var] = lifted
+        self.use(block.result)
+
+    def use(self, atom):
+        if isinstance(atom, anf.Var) and atom.glob and atom.name in self.functions:
+            self.boxed[atom.name] = self.functions[atom.name]
+
+
+def convert(decls, functions):
+    conversion = Conversion(functions)
+    for decl in decls:
+        conversion.decl(decl)
+    return conversion
@@ -1,12 +1,33 @@
+import io
 import os
-import signal
-import subprocess
-import tempfile
+import sys
 
-from microml import exceptions, parser, typing
+from microml import anf, ast, cgen, exceptions, parser, typing
+
+# Building, running and tiering pull in heavy modules, so they are imported
+# where they are used to keep typechecking a file fast.
 
 PRELUDE = """
 #include <stdio.h>
+#include <stdlib.h>
+
+typedef struct ml_closure ml_closure;
+
+typedef union {
+    int i;
+    ml_closure* f;
+} ml_value;
+
+struct ml_closure {
+    void (*fn)(void);
+    ml_value env[];
+};
+
+ml_closure* ml_alloc(void (*fn)(void), int size) {
+    ml_closure* c = malloc(sizeof(ml_closure) + size * sizeof(ml_value));
+    c->fn = fn;
+    return c;
+}
 
 int print(int in) {
     printf("%d\\n", in);
@@ -14,89 +35,323 @@ int print(int in) {
 }
 """
 
+KERNEL_PRELUDE = """
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+"""
+
+KERNEL_DRIVER = """
+static int ml_apply(const int* ml_r) {{
+  return {name}({args});
+}}
+
+int main(int argc, char** argv) {{
+  if (argc != 3) {{
+    fprintf(stderr, "usage: %s <input> <output>\\n", argv[0]);
+    return 1;
+  }}
+
+  int ml_in = open(argv[1], O_RDONLY);
+  struct stat ml_st;
+  if (ml_in < 0 || fstat(ml_in, &ml_st) < 0) {{
+    perror(argv[1]);
+    return 1;
+  }}
+
+  size_t ml_record = {arity} * sizeof(int);
+  if (ml_st.st_size % ml_record) {{
+    fprintf(stderr, "%s: size is not a multiple of %zu bytes\\n", argv[1], ml_record);
+    return 1;
+  }}
+  size_t ml_n = ml_st.st_size / ml_record;
+
+  int ml_out = open(argv[2], O_RDWR | O_CREAT | O_TRUNC, 0644);
+  if (ml_out < 0 || ftruncate(ml_out, ml_n * sizeof(int)) < 0) {{
+    perror(argv[2]);
+    return 1;
+  }}
+  if (!ml_n) return 0;
+
+  const int* ml_src = mmap(NULL, ml_st.st_size, PROT_READ, MAP_PRIVATE, ml_in, 0);
+  int* ml_dst = mmap(NULL, ml_n * sizeof(int), PROT_READ | PROT_WRITE, MAP_SHARED, ml_out, 0);
+  if (ml_src == MAP_FAILED || ml_dst == MAP_FAILED) {{
+    perror("mmap");
+    return 1;
+  }}
+  madvise((void*) ml_src, ml_st.st_size, MADV_SEQUENTIAL);
+
+  for (size_t ml_i = 0; ml_i < ml_n; ml_i++) {{
+    ml_dst[ml_i] = ml_apply(ml_src + ml_i * {arity});
+  }}
+
+  munmap((void*) ml_src, ml_st.st_size);
+  munmap(ml_dst, ml_n * sizeof(int));
+  close(ml_in);
+  close(ml_out);
+  return 0;
+}}
+"""
+
+
+class Printr:
+    name = "print"
+
+    def eval(self, env, arg):
+        print(anf.force(arg[0]))
+        return 0
+
 
 class Compiler:
-    def __init__(self, interactive=True):
+    def __init__(self, interactive=True, tier_threshold=None, background=False):
         self.interactive = interactive
+        self.tiers = None
+        if tier_threshold is not None:
+            from microml import tiering
+
+            self.tiers = tiering.Tiers(self, tier_threshold)
+        self.builder = None
+        if background:
+            from microml import builder
+
+            self.builder = builder.Builder(self.build)
         self.p = parser.Parser()
-        self.equations = []
+        self.equations = {}
+        self.dependencies = {}
         self.symtab = {"print": typing.Func([typing.Int()], typing.Int())}
         self.code = []
-        self.main = -1
+        self.ir = {}
+        self.pure = set()
         self.unifier = None
+        self.generation = 0
 
     def compile(self, source):
+        self.generation += 1
         parsed, pos = self.p.parse(source, self.interactive)
+        name = parsed.name
+        deps = ast.free_names(parsed.expr) & self.dependencies.keys()
+        dependents = self.dependents(name)
 
-        if parsed.name in self.symtab:
-            print("Warning! Redefining {}!".format(parsed.name))
+        if name in deps or deps & dependents:
+            raise exceptions.MLTypingException(
+                'redefining "{}" would make it depend on itself'.format(name)
+            )
 
-        self.symtab = {
-            **self.symtab,
-            **typing.assign_typenames(parsed.expr, self.symtab),
-        }
-        self.equations.extend(typing.generate_equations(parsed.expr))
-        self.unifier = typing.unify_equations(self.equations)
-        t = typing.get_expression_type(parsed.expr.typ, self.unifier)
+        typing.assign_typenames(parsed.expr, self.symtab)
 
-        if self.interactive:
-            print("{} :: {}".format(parsed, t))
+        redefined = name in self.symtab
+        if redefined:
+            print("Warning! Redefining {}!".format(name))
 
-        self.symtab[parsed.name] = t
+        self.dependencies[name] = deps
+        self.code = [
+            *(n for n in self.code if n.name != name and n.name not in dependents),
+            parsed,
+            *(n for n in self.code if n.name in dependents),
+        ]
+        # dependents refer to the new declarations through their type
+        # variables, so that a single unification settles all of them
+        changed = self.code[len(self.code) - len(dependents) - 1 :]
+        symtab = {**self.symtab, name: parsed.expr.typ}
+        for node in changed[1:]:
+            typing.assign_typenames(node.expr, symtab)
+            symtab[node.name] = node.expr.typ
+        self.check(changed, incremental=not redefined)
+        if self.tiers is not None:
+            self.tiers.invalidate(node.name for node in changed)
 
-        if parsed.name == "main":
-            self.main = len(self.code)
+        self.prebuild()
+        return pos
 
-        self.code.append(parsed)
+    def prebuild(self):
+        if self.builder is None:
+            return
+        if "main" not in self.ir:
+            return self.builder.cancel()
+        self.builder.submit(self.generation, self.frozen().emit)
 
-        return pos
+    def frozen(self):
+        import copy
 
-    def get_type(self):
-        return lambda x: typing.get_expression_type(x, self.unifier)
+        # background builds emit from a copy, so that declarations compiled
+        # in the meantime cannot change the program under them
+        snapshot = copy.copy(self)
+        snapshot.code = list(self.code)
+        snapshot.ir = dict(self.ir)
+        snapshot.symtab = dict(self.symtab)
+        return snapshot
 
-    def interpret(self):
-        class Printr:
-            def eval(self, env, arg):
-                print(arg[0])
+    def requirements(self, name):
+        found = {name}
+        todo = [name]
+        while todo:
+            for dep in self.dependencies[todo.pop()]:
+                if dep not in found:
+                    found.add(dep)
+                    todo.append(dep)
+        return found
 
-        env = {"print": Printr()}
+    def dependents(self, name):
+        found = set()
+        todo = [name]
+        while todo:
+            current = todo.pop()
+            for other, deps in self.dependencies.items():
+                if current in deps and other not in found:
+                    found.add(other)
+                    todo.append(other)
+        return found
+
+    def check(self, decls, incremental=False):
+        for decl in decls:
+            self.equations[decl.name] = typing.generate_equations(decl.expr)
+        # a new declaration only adds equations, so the previous solution
+        # still holds and can be extended; a redefinition drops some
+        if incremental and self.unifier is not None:
+            self.unifier = typing.unify_equations(
+                (eq for decl in decls for eq in self.equations[decl.name]),
+                self.unifier,
+            )
+        else:
+            self.unifier = typing.unify_equations(
+                eq for node in self.code for eq in self.equations[node.name]
+            )
+
+        for decl in decls:
+            t = typing.get_expression_type(decl.expr.typ, self.unifier)
+
+            if self.interactive:
+                print("{} :: {}".format(decl, t))
+
+            self.symtab[decl.name] = t
+
+            ir = anf.lower(decl, self.pure)
+            self.ir[decl.name] = ir
+            if isinstance(ir, anf.Function) and anf.is_pure(ir, self.pure):
+                self.pure.add(decl.name)
+            else:
+                self.pure.discard(decl.name)
+
+    def lookup(self, name):
         for node in self.code:
-            node.eval(env)
+            if node.name == name:
+                return node
+
+    def environment(self, lazy=False):
+        env = {"print": Printr()}
+        if lazy:
+            env[anf.LAZY] = True
+        return anf.environment((self.ir[node.name] for node in self.code), env)
+
+    def interpret(self, profiler=None, lazy=False):
+        env = self.environment(lazy)
+        if self.tiers is not None:
+            for name, value in env.items():
+                if isinstance(value, anf.Closure):
+                    env[name] = self.tiers.wrap(name, value)
+        if profiler is not None:
+            env[anf.TRACER] = profiler
         if "main" in env:
             try:
-                env["main"].eval(env, [])
+                if profiler is None:
+                    env["main"].eval(env, [])
+                else:
+                    profiler.call("main", None, lambda: env["main"].eval(env, []))
             except Exception as e:
                 raise exceptions.MLEvalException(str(e))
 
+    def vectorize(self, name):
+        from microml import vectorize
+
+        decls = {node.name: node for node in self.code}
+        return vectorize.vectorize(
+            name, decls, self.symtab.get(name), self.environment()
+        )
+
+    def dump(self, name=None):
+        typeof = lambda x: typing.apply_unifier(x, self.unifier)
+        return "\n\n".join(
+            anf.dump(self.ir[node.name], typeof)
+            for node in self.code
+            if name is None or node.name == name
+        )
+
+    def emit_declarations(self, out, names=None, main=False, checked=False):
+        if self.unifier is None:
+            raise exceptions.MLTypingException("The program does not type check!")
+        decls = [
+            self.ir[node.name]
+            for node in self.code
+            if node.name != "main" and (names is None or node.name in names)
+        ]
+        if main and "main" in self.ir:
+            decls.append(self.ir["main"])
+        typeof = lambda x: typing.apply_unifier(x, self.unifier)
+        functions = cgen.functions(self.ir, self.symtab["print"])
+        cgen.emit(out, decls, typeof, functions, checked)
+
+    def emit(self, out):
+        out.write(PRELUDE)
+        self.emit_declarations(out, main=True)
+
+    def build(self, emit, output, flags=(), stderr=None, started=None):
+        import subprocess
+
+        cc = os.getenv("CC", "gcc")
+        try:
+            proc = subprocess.Popen(
+                [cc, *flags, "-x", "c", "-", "-o", output],
+                stdin=subprocess.PIPE,
+                stderr=stderr,
+            )
+        except OSError as e:
+            raise exceptions.MLCompilerException(
+                "could not run {}: {}".format(cc, e.strerror)
+            )
+        if started is not None:
+            started(proc)
+
+        try:
+            with io.TextIOWrapper(proc.stdin, encoding="utf-8") as stdin:
+                emit(stdin)
+        except BrokenPipeError:
+            pass
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+
+        code = proc.wait()
+        if code:
+            raise exceptions.MLCompilerException(
+                "{} failed with exit code {}!".format(cc, code)
+            )
+
     def execute(self):
         if self.code == []:
             raise exceptions.MLCompilerException("Nothing to execute!")
-        if self.main == -1:
+        if self.lookup("main") is None:
             raise exceptions.MLCompilerException("No `main` function specified!")
 
-        main_node = self.code[self.main]
-        compiled = "{}\n{}\n{}".format(
-            PRELUDE,
-            "\n".join(
-                node.compile(self.get_type())
-                for node in self.code
-                if node.name != "main"
-            ),
-            main_node.compile(self.get_type()),
-        )
+        if self.builder is not None:
+            build = self.builder.submit(self.generation, self.frozen().emit)
+            build.wait()
+            sys.stderr.write(build.errors)
+            if build.error is not None:
+                raise build.error
+            return self.run(build.output)
 
-        cc = os.getenv("CC", "gcc")
+        import tempfile
 
-        _, i = tempfile.mkstemp()
-        _, o = tempfile.mkstemp()
-        i = "{}.c".format(i)
-        with open(i, "w+") as f:
-            f.write(compiled)
+        with tempfile.TemporaryDirectory() as d:
+            o = os.path.join(d, "main")
+            self.build(self.emit, o)
+            self.run(o)
 
-        try:
-            print(subprocess.check_output([cc, i, "-o", o]).decode("utf-8"), end="")
-        except subprocess.CalledProcessError as e:
-            raise exceptions.MLCompilerException(str(e))
+    def run(self, o):
+        import signal
+        import subprocess
 
         try:
             print(subprocess.check_output([o]).decode("utf-8"), end="")
@@ -111,3 +366,40 @@ class Compiler:
             raise exceptions.MLCompilerException(
                 "Running the executable failed with exit code {}!".format(code)
             )
+
+    def kernel(self, name, output):
+        if name == "main":
+            raise exceptions.MLCompilerException("`main` cannot be used as a kernel!")
+        decl = self.lookup(name)
+        typ = self.symtab.get(name)
+        if decl is None:
+            raise exceptions.MLCompilerException(
+                "No function `{}` defined!".format(name)
+            )
+        if not isinstance(decl.expr, ast.Lambda) or not isinstance(typ, typing.Func):
+            raise exceptions.MLCompilerException(
+                "`{}` is not a function and cannot be used as a kernel!".format(name)
+            )
+        arity = len(typ.argtypes)
+        if not arity or any(
+            isinstance(t, typing.Func) for t in [*typ.argtypes, typ.rettype]
+        ):
+            raise exceptions.MLCompilerException(
+                "`{}` has type {}, but kernels need Int/Bool arguments!".format(
+                    name, typ
+                )
+            )
+
+        driver = KERNEL_DRIVER.format(
+            name=cgen.c_name(name),
+            arity=arity,
+            args=", ".join("ml_r[{}]".format(i) for i in range(arity)),
+        )
+
+        def emit(out):
+            out.write(PRELUDE)
+            out.write(KERNEL_PRELUDE)
+            self.emit_declarations(out, self.requirements(name))
+            out.write(driver)
+
+        self.build(emit, output, ["-O2"])
@@ -1,5 +1,5 @@
+import functools
 import re
-import sys
 
 from microml import exceptions
 
@@ -46,7 +46,7 @@ RULES = [
     ("true", TRUE),
     ("false", FALSE),
     ("lambda", LAMBDA),
-    ("\d+", INT),
+    (r"\d+", INT),
     ("->", ARROW),
     ("!=", NEQ),
     ("==", EQEQ),
@@ -54,40 +54,44 @@ RULES = [
     ("<=", LEQ),
     ("<", LT),
     (">", GT),
-    ("\+", PLUS),
-    ("\-", MINUS),
-    ("\*", TIMES),
+    (r"\+", PLUS),
+    (r"\-", MINUS),
+    (r"\*", TIMES),
     ("/", DIV),
-    ("\(", LPAREN),
-    ("\)", RPAREN),
+    (r"\(", LPAREN),
+    (r"\)", RPAREN),
     ("=", EQ),
     (",", COMMA),
-    ("[a-zA-Z_]\w*", ID),
+    (r"[a-zA-Z_]\w*", ID),
 ]
 
 
-class Lexer:
-    def __init__(self):
-        idx = 1
-        regex_parts = []
-        self.group_type = {}
+@functools.lru_cache(maxsize=None)
+def tables():
+    idx = 1
+    regex_parts = []
+    group_type = {}
+
+    for regex, typ in RULES:
+        groupname = "GROUP%s" % idx
+        regex_parts.append("(?P<%s>%s)" % (groupname, regex))
+        group_type[groupname] = typ
+        idx += 1
+
+    return re.compile("|".join(regex_parts)), group_type
+
 
-        for regex, typ in RULES:
-            groupname = "GROUP%s" % idx
-            regex_parts.append("(?P<%s>%s)" % (groupname, regex))
-            self.group_type[groupname] = typ
-            idx += 1
+RE_WS_SKIP = re.compile(r"\S")
+RE_COMMENT = re.compile(r"\(\*[^(\*\))]+\*\)", re.MULTILINE | re.DOTALL)
 
-        self.regex = re.compile("|".join(regex_parts))
-        self.re_ws_skip = re.compile("\S")
+
+class Lexer:
+    def __init__(self):
+        self.regex, self.group_type = tables()
+        self.re_ws_skip = RE_WS_SKIP
 
     def start(self, buf):
-        self.buf = re.sub(
-            r"\(\*[^(\*\))]+\*\)",
-            lambda m: " " * (m.end() - m.start()),
-            buf,
-            flags=re.MULTILINE | re.DOTALL,
-        )
+        self.buf = RE_COMMENT.sub(lambda m: " " * (m.end() - m.start()), buf)
         self.pos = 0
 
     def token(self):
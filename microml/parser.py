@@ -1,31 +1,59 @@
 from microml import ast, exceptions, lexer
 
-
-OPERATORS = {
-    lexer.NEQ,
-    lexer.EQEQ,
-    lexer.GEQ,
-    lexer.LEQ,
-    lexer.LT,
-    lexer.GT,
-    lexer.PLUS,
-    lexer.MINUS,
-    lexer.TIMES,
-    lexer.DIV,
+BINDING_POWER = {
+    lexer.NEQ: 10,
+    lexer.EQEQ: 10,
+    lexer.GEQ: 20,
+    lexer.LEQ: 20,
+    lexer.LT: 20,
+    lexer.GT: 20,
+    lexer.PLUS: 30,
+    lexer.MINUS: 30,
+    lexer.TIMES: 40,
+    lexer.DIV: 40,
 }
 
+# The passes after parsing walk expressions recursively, so deeper
+# expressions are rejected here rather than overflowing the stack later on.
+MAX_DEPTH = 200
+
+
+def depth(node):
+    deepest = 0
+    todo = [(node, 1)]
+    while todo:
+        node, level = todo.pop()
+        deepest = max(deepest, level)
+        todo.extend((child, level + 1) for child in node.children)
+    return deepest
+
 
 class Parser:
     def __init__(self):
         self.lexer = lexer.Lexer()
         self.token = None
-        self.operators = {"!=", "==", ">=", "<=", "<", ">", "+", "-", "*"}
+        self.prefix = {
+            lexer.INT: self.intexpr,
+            lexer.TRUE: self.boolexpr,
+            lexer.FALSE: self.boolexpr,
+            lexer.ID: self.idexpr,
+            lexer.LPAREN: self.parenexpr,
+            lexer.IF: self.ifexpr,
+            lexer.LAMBDA: self.lambdaexpr,
+        }
 
     def parse(self, source, should_terminate=True):
         self.lexer.start(source)
         self.next()
 
-        decl = self.decl()
+        try:
+            decl = self.decl()
+        except RecursionError:
+            self.error("Expression is nested too deeply!")
+        if depth(decl.expr) > MAX_DEPTH:
+            raise exceptions.MLParserException(
+                "Expression is nested deeper than {} levels!".format(MAX_DEPTH)
+            )
         if self.token.typ is not None and should_terminate:
             self.error(
                 'Unexpected token "{}" at {}'.format(self.token.val, self.token.pos)
@@ -67,39 +95,41 @@ class Parser:
             return ast.Decl(name, ast.Lambda(argnames, expr))
         return ast.Decl(name, expr)
 
-    def expr(self):
+    def expr(self, min_power=0):
         node = self.expr_component()
-        if self.token.typ in OPERATORS:
+        power = BINDING_POWER.get(self.token.typ, 0)
+        while power > min_power:
             op = self.token.typ
             self.next()
-            rhs = self.expr_component()
-            return ast.Op(op, node, rhs)
+            node = ast.Op(op, node, self.expr(power))
+            power = BINDING_POWER.get(self.token.typ, 0)
         return node
 
     def expr_component(self):
-        token = self.token
+        rule = self.prefix.get(self.token.typ)
+        if rule is None:
+            self.error("We don’t support {} yet!".format(self.token.typ))
+        return rule()
 
-        if token.typ == lexer.INT:
-            self.next()
-            return ast.Int(token.val)
-        if token.typ in [lexer.FALSE, lexer.TRUE]:
-            self.next()
-            return ast.Bool(token.typ == lexer.TRUE)
-        if token.typ == lexer.ID:
-            self.next()
-            if self.token.typ == lexer.LPAREN:
-                return self.app(token.val)
-            return ast.Id(token.val)
-        if token.typ == lexer.LPAREN:
-            self.next()
-            expr = self.expr()
-            self.match(lexer.RPAREN)
-            return expr
-        if token.typ == lexer.IF:
-            return self.ifexpr()
-        if token.typ == lexer.LAMBDA:
-            return self.lambdaexpr()
-        self.error("We don’t support {} yet!".format(token.typ))
+    def intexpr(self):
+        return ast.Int(self.match(lexer.INT))
+
+    def boolexpr(self):
+        typ = self.token.typ
+        self.next()
+        return ast.Bool(typ == lexer.TRUE)
+
+    def idexpr(self):
+        name = self.match(lexer.ID)
+        if self.token.typ == lexer.LPAREN:
+            return self.app(name)
+        return ast.Id(name)
+
+    def parenexpr(self):
+        self.match(lexer.LPAREN)
+        expr = self.expr()
+        self.match(lexer.RPAREN)
+        return expr
 
     def ifexpr(self):
         self.match(lexer.IF)
@@ -0,0 +1,90 @@
+import time
+
+from microml import exceptions
+
+
+class Stats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+    def record(self, inclusive, exclusive):
+        self.calls += 1
+        self.inclusive += inclusive
+        self.exclusive += exclusive
+
+
+class Profiler:
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.steps = 0
+        self.functions = {}
+        self.sites = {}
+        self.stacks = {}
+        self.stack = []
+        self.children = [0.0]
+
+    def apply(self, site, f, env, args):
+        name = f.name or "<lambda>"
+        return self.call(name, site, lambda: f.eval(env, args))
+
+    def call(self, name, site, thunk):
+        self.steps += 1
+        if self.budget is not None and self.steps > self.budget:
+            raise exceptions.MLEvalException(
+                "step budget of {} exhausted".format(self.budget)
+            )
+
+        caller = self.stack[-1] if self.stack else "<top>"
+        self.stack.append(name)
+        self.children.append(0.0)
+        start = time.perf_counter()
+        try:
+            return thunk()
+        finally:
+            inclusive = time.perf_counter() - start
+            exclusive = inclusive - self.children.pop()
+            self.children[-1] += inclusive
+
+            key = ";".join(self.stack)
+            self.stacks[key] = self.stacks.get(key, 0.0) + exclusive
+            self.stack.pop()
+
+            if name not in self.functions:
+                self.functions[name] = Stats(name)
+            self.functions[name].record(inclusive, exclusive)
+            if site is not None:
+                if site not in self.sites:
+                    self.sites[site] = Stats("{}: {}".format(caller, site))
+                self.sites[site].record(inclusive, exclusive)
+
+    def table(self, title, stats, n):
+        lines = [
+            "{:>8} {:>12} {:>12}  {}".format("calls", "incl (ms)", "excl (ms)", title)
+        ]
+        for s in sorted(stats, key=lambda s: s.inclusive, reverse=True)[:n]:
+            lines.append(
+                "{:>8} {:>12.3f} {:>12.3f}  {}".format(
+                    s.calls, s.inclusive * 1000, s.exclusive * 1000, s.name
+                )
+            )
+        return "\n".join(lines)
+
+    def report(self, n=10):
+        return "{}\n\n{}".format(
+            self.table("function", self.functions.values(), n),
+            self.table("call site", self.sites.values(), n),
+        )
+
+    def collapsed(self):
+        return "\n".join(
+            "{} {}".format(stack, round(elapsed * 1000000))
+            for stack, elapsed in sorted(self.stacks.items())
+        )
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+            f.write("\n")
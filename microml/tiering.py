@@ -0,0 +1,181 @@
+import _ctypes
+import concurrent.futures
+import ctypes
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from microml import ast, cgen, exceptions, typing
+
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
+# The interpreter computes with unbounded integers, so native code checks its
+# arithmetic and reports overflow, and such calls are redone in the interpreter.
+PRELUDE = """
+#include <limits.h>
+
+int ml_overflow;
+
+static int ml_check(long long value) {
+    if (value < INT_MIN || value > INT_MAX) {
+        ml_overflow = 1;
+    }
+    return (int) value;
+}
+"""
+
+
+def first_order(typ):
+    return isinstance(typ, (typing.Int, typing.Bool))
+
+
+def compilable(node, argnames, callees):
+    if isinstance(node, ast.Id):
+        return node.name in argnames
+    if isinstance(node, ast.Int):
+        return INT_MIN <= node.eval({}) <= INT_MAX
+    if isinstance(node, ast.Lambda):
+        return False
+    # the interpreter divides into floats, so native code would disagree
+    if isinstance(node, ast.Op) and (node.op == "/" or node.op not in ast.OPERATORS):
+        return False
+    if isinstance(node, ast.App):
+        if node.f.name in argnames:
+            return False
+        callees.add(node.f.name)
+        return all(compilable(arg, argnames, callees) for arg in node.args)
+    return all(compilable(child, argnames, callees) for child in node.children)
+
+
+def closure(compiler, name):
+    found = set()
+    todo = [name]
+    while todo:
+        current = todo.pop()
+        if current in found:
+            continue
+        decl = compiler.lookup(current)
+        typ = compiler.symtab.get(current)
+        if decl is None or not isinstance(decl.expr, ast.Lambda):
+            return None
+        if not isinstance(typ, typing.Func):
+            return None
+        if not all(first_order(t) for t in [*typ.argtypes, typ.rettype]):
+            return None
+        callees = set()
+        if not compilable(decl.expr.expr, set(decl.expr.argnames), callees):
+            return None
+        found.add(current)
+        todo.extend(callees)
+    return found
+
+
+def release(future):
+    if not future.cancelled() and future.exception() is None:
+        _ctypes.dlclose(future.result()._handle)
+
+
+class TieredFunction:
+    def __init__(self, name, lam, tiers):
+        self.name = name
+        self.lam = lam
+        self.tiers = tiers
+        self.calls = 0
+        self.pending = tiers.cached(name)
+        self.native = None
+        self.overflow = None
+        self.boolean = False
+
+    def eval(self, env, args):
+        if self.native is not None and all(
+            type(a) in (int, bool) and INT_MIN <= a <= INT_MAX for a in args
+        ):
+            self.overflow.value = 0
+            result = self.native(*args)
+            if not self.overflow.value:
+                return bool(result) if self.boolean else result
+
+        self.calls += 1
+        if self.calls == self.tiers.threshold and self.pending is None:
+            self.pending = self.tiers.promote(self.name)
+        if self.pending is not None and self.pending.done():
+            self.tiers.bind(self, self.pending)
+            self.pending = None
+        return self.lam.eval(env, args)
+
+
+class Tiers:
+    def __init__(self, compiler, threshold):
+        self.compiler = compiler
+        self.threshold = threshold
+        self.libraries = {}
+        self.rejected = set()
+        self.executor = None
+
+    def wrap(self, name, lam):
+        return TieredFunction(name, lam, self)
+
+    def source(self, name):
+        names = closure(self.compiler, name)
+        if names is None:
+            return None
+        out = io.StringIO()
+        out.write(PRELUDE)
+        self.compiler.emit_declarations(out, names, checked=True)
+        return out.getvalue()
+
+    def cached(self, name):
+        return self.libraries.get(name)
+
+    def promote(self, name):
+        if name in self.rejected:
+            return None
+        if name not in self.libraries:
+            source = self.source(name)
+            if source is None:
+                self.rejected.add(name)
+                return None
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            self.libraries[name] = self.executor.submit(self.load, source)
+        return self.libraries[name]
+
+    # Native code for a function also contains everything it calls, so the
+    # compiler invalidates a redefined name together with its dependents.
+    def invalidate(self, names):
+        for name in names:
+            self.rejected.discard(name)
+            future = self.libraries.pop(name, None)
+            if future is not None:
+                future.add_done_callback(release)
+
+    def load(self, source):
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, "native.so")
+            self.compiler.build(
+                lambda out: out.write(source),
+                path,
+                ["-shared", "-fPIC", "-O2"],
+                stderr=subprocess.DEVNULL,
+            )
+            return ctypes.CDLL(path)
+        finally:
+            shutil.rmtree(d)
+
+    def bind(self, fn, future):
+        try:
+            library = future.result()
+            native = getattr(library, cgen.c_name(fn.name))
+            overflow = ctypes.c_int.in_dll(library, "ml_overflow")
+        except (exceptions.MLException, OSError, AttributeError, ValueError):
+            return
+        typ = self.compiler.symtab[fn.name]
+        native.argtypes = [ctypes.c_int] * len(typ.argtypes)
+        native.restype = ctypes.c_int
+        fn.boolean = isinstance(typ.rettype, typing.Bool)
+        fn.overflow = overflow
+        fn.native = native
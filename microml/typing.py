@@ -226,11 +226,12 @@ def unify_variable(v, typ, subst):
         return unify(v, subst[typ.name], subst)
     if occurs_check(v, typ, subst):
         return None
-    return {**subst, v.name: typ}
+    subst[v.name] = typ
+    return subst
 
 
-def unify_equations(eqs):
-    subst = {}
+def unify_equations(eqs, subst=None):
+    subst = {} if subst is None else dict(subst)
     for eq in eqs:
         subst = unify(eq.left, eq.right, subst)
         if subst is None:
@@ -0,0 +1,195 @@
+from microml import ast, exceptions, typing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Overflow(Exception):
+    pass
+
+
+# Integers are computed as int64, which wraps around silently. The checked
+# operations notice and the whole call falls back to the exact interpreter.
+def wraps(result):
+    return np.asarray(result).dtype == np.int64
+
+
+def checked_add(a, b):
+    result = np.add(a, b)
+    if wraps(result) and np.any(((a ^ result) & (b ^ result)) < 0):
+        raise Overflow()
+    return result
+
+
+def checked_subtract(a, b):
+    result = np.subtract(a, b)
+    if wraps(result) and np.any(((a ^ b) & (a ^ result)) < 0):
+        raise Overflow()
+    return result
+
+
+def checked_multiply(a, b):
+    result = np.multiply(a, b)
+    if wraps(result) and np.any(np.abs(np.multiply(a, b, dtype=np.float64)) >= 2.0**62):
+        raise Overflow()
+    return result
+
+
+def operand(a):
+    a = np.asarray(a)
+    if a.dtype.kind in "iu":
+        if np.can_cast(a.dtype, np.int64):
+            return a.astype(np.int64, copy=False)
+        return a.astype(object)
+    return a
+
+
+def ufuncs():
+    return {
+        "+": checked_add,
+        "-": checked_subtract,
+        "*": checked_multiply,
+        "/": np.true_divide,
+        "<": np.less,
+        "<=": np.less_equal,
+        ">": np.greater,
+        ">=": np.greater_equal,
+        "==": np.equal,
+        "!=": np.not_equal,
+    }
+
+
+def translate(node, decls, argnames, active):
+    if isinstance(node, ast.Int):
+        value = node.eval({})
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise Unsupported(node.value)
+        value = np.int64(value)
+        return lambda env: value
+    if isinstance(node, ast.Bool):
+        value = np.bool_(node.eval({}))
+        return lambda env: value
+    if isinstance(node, ast.Id):
+        if node.name in argnames:
+            name = node.name
+            return lambda env: env[name]
+        decl = decls.get(node.name)
+        if decl is None or isinstance(decl.expr, ast.Lambda):
+            raise Unsupported(node.name)
+        if node.name in active:
+            raise Unsupported(node.name)
+        return translate(decl.expr, decls, (), active | {node.name})
+    if isinstance(node, ast.Op):
+        f = ufuncs().get(node.op)
+        if f is None:
+            raise Unsupported(node.op)
+        left = translate(node.left, decls, argnames, active)
+        right = translate(node.right, decls, argnames, active)
+        return lambda env: f(left(env), right(env))
+    if isinstance(node, ast.If):
+        ifx = translate(node.ifx, decls, argnames, active)
+        thenx = translate(node.thenx, decls, argnames, active)
+        elsex = translate(node.elsex, decls, argnames, active)
+        return lambda env: np.where(ifx(env), thenx(env), elsex(env))
+    if isinstance(node, ast.App):
+        name = node.f.name
+        decl = decls.get(name)
+        if name in argnames or decl is None or name in active:
+            raise Unsupported(name)
+        if not isinstance(decl.expr, ast.Lambda):
+            raise Unsupported(name)
+        callee = decl.expr
+        if len(callee.argnames) != len(node.args):
+            raise Unsupported(name)
+        args = [translate(arg, decls, argnames, active) for arg in node.args]
+        body = translate(callee.expr, decls, set(callee.argnames), active | {name})
+        names = callee.argnames
+        return lambda env: body({n: a(env) for n, a in zip(names, args)})
+    raise Unsupported(type(node).__name__)
+
+
+def check_type(name, typ):
+    if not isinstance(typ, typing.Func):
+        raise exceptions.MLCompilerException(
+            "`{}` is not a function and cannot be vectorized!".format(name)
+        )
+    for t in [*typ.argtypes, typ.rettype]:
+        if isinstance(t, typing.Func):
+            raise exceptions.MLCompilerException(
+                "`{}` has type {}, but only Int/Bool functions can be vectorized!".format(
+                    name, typ
+                )
+            )
+
+
+class Vectorized:
+    def __init__(self, name, lam, kernel, env):
+        self.name = name
+        self.lam = lam
+        self.kernel = kernel
+        self.env = env
+
+    def __call__(self, *arrays):
+        if len(arrays) != len(self.lam.argnames):
+            raise exceptions.MLEvalException(
+                "{} was called with {} arguments, but expected {}".format(
+                    self.name, len(arrays), len(self.lam.argnames)
+                )
+            )
+        arrays = np.broadcast_arrays(*(operand(a) for a in arrays))
+        if self.kernel is None:
+            return self.fallback(arrays)
+        env = dict(zip(self.lam.argnames, arrays))
+        try:
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                result = self.kernel(env)
+        except Overflow:
+            return self.fallback(arrays)
+        if arrays:
+            return np.broadcast_to(result, arrays[0].shape).copy()
+        return np.asarray(result)
+
+    def fallback(self, arrays):
+        if not arrays:
+            return np.asarray(self.scalar([]))
+        out = [
+            self.scalar([a.item() for a in args])
+            for args in zip(*(a.flat for a in arrays))
+        ]
+        exact = any(type(v) is int and not INT64_MIN <= v <= INT64_MAX for v in out)
+        return np.array(out, dtype=object if exact else None).reshape(arrays[0].shape)
+
+    def scalar(self, args):
+        try:
+            return self.env[self.name].eval(self.env, args)
+        except Exception as e:
+            raise exceptions.MLEvalException(str(e))
+
+
+def vectorize(name, decls, typ, env):
+    if np is None:
+        raise exceptions.MLCompilerException("Vectorization requires numpy!")
+    decl = decls.get(name)
+    if decl is None:
+        raise exceptions.MLCompilerException("No function `{}` defined!".format(name))
+    check_type(name, typ)
+    lam = decl.expr
+    if not isinstance(lam, ast.Lambda):
+        raise exceptions.MLCompilerException(
+            "`{}` is not a lambda and cannot be vectorized!".format(name)
+        )
+    try:
+        kernel = translate(lam.expr, decls, set(lam.argnames), {name})
+    except Unsupported:
+        kernel = None
+    return Vectorized(name, lam, kernel, env)